@@ -1,5 +1,17 @@
 import numpy as np
 from collections import deque
+from corridors import Corridor_graph
+from motion import Accelerated_motion
+import heapq
+import json
+import os
+import threading
+import time
+
+# Tuned exploration parameters, written by tuner.py and keyed by algorithm class name and maze dimension.
+profile_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exploration_profile.json")
+# Default location for learned maps persisted between runs.
+knowledge_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
 
 class Algorithm(object):
     """
@@ -20,6 +32,10 @@ class Algorithm(object):
         rotation:    one of [-90, 0, 90] indicating turn or straight.
         movement:    integer from 0 - 3 inclusive, indicating the number of cells to move in the new direction.
         transform:   integer tuple that can be added to a location to move it one cell in the direction of heading
+        knowledge_dir: directory holding maps learned on earlier runs, None disables loading and saving them
+        fingerprint: key identifying the maze, built from its dimension and the walls sensed from the start cell
+        warm_start:  True if the map was loaded from an earlier run rather than started blank
+        known:       uint8 numpy array of wall bits for every cell side observed so far, open or walled
     
     """
     
@@ -31,8 +47,12 @@ class Algorithm(object):
         self.start = start
         self.exploring = True
         self.maze = self.blank_maze(maze_dim, map_layers=2, goal=self.goal)
+        self.known = self.blank_maze(maze_dim, map_layers=1, goal=self.goal)[:, :, 0] # Outer walls are known.
         self.valid_walls = [1, 2, 4, 8]
         self.dead_ends = [7, 11, 13, 14]
+        self.knowledge_dir = None
+        self.fingerprint = None
+        self.warm_start = False
         
         
     def algorithm_choice(self, walls = list(), heading=0, location =(0, 0)):
@@ -70,20 +90,156 @@ class Algorithm(object):
     def update_maze(self, maze, walls, location):
         """ Update maze representation to reflect current sensor data. """
         
+        if (self.fingerprint == None) and (tuple(location) == tuple(self.start)):
+            self.fingerprint = self.maze_fingerprint(walls)
+            if self.knowledge_dir:
+                maze = self.load_knowledge(maze, walls)
         for w, wall in enumerate(walls):
-            if wall == 0: # If this cell has a wall in the given direction.
-                x = location[0]
-                y = location[1]
-                maze[x, y, 0] = self.mark_wall(maze[x, y, 0], w) # Mark visible wall
-
-                transform = self.decode_heading(w)                
-                x += transform[0]
-                y += transform[1]
-                if (x < maze.shape[0]) and (x >= 0) and (y < maze.shape[1]) and (y >= 0):
-                    maze[x, y, 0] = self.mark_wall(maze[x, y, 0], (w+2)%4) # Mark other side of visible wall
+            if wall >= 0: # Blind spots (-1) carry no information.
+                maze = self.map_ray(maze, w, wall, location)
         return maze
 
     
+    def map_ray(self, maze, heading, distance, location):
+        """ Map a whole sensor ray. A reading of distance means that many open cells, then a wall. Every passage
+            along the ray is opened, which also drops stored walls the sensors see through, and the far wall is
+            marked from both sides. All sides passed are recorded in the known layer. """
+        
+        bit = 2**heading
+        back = 2**((heading+2)%4)
+        walls = self.ray_view(maze[:, :, 0], heading, distance + 2, location) # Ray cells plus any cell beyond the wall
+        known = self.ray_view(self.known, heading, distance + 2, location)
+        walls[:distance] &= 15 - bit # Open toward the heading
+        walls[1:distance+1] &= 15 - back # Open back toward the robot
+        walls[distance] |= bit # Mark visible wall
+        walls[distance+1:distance+2] |= back # Mark other side of visible wall
+        known[:distance+1] |= bit
+        known[1:distance+2] |= back
+        return maze
+    
+    
+    def ray_view(self, layer, heading, length, location):
+        """ Return a 1-D view of up to length cells of a map layer, starting at location and moving toward
+            heading. The view stops at the edge of the map. """
+        
+        x, y = location
+        if heading == 0: return layer[x, y:y+length]
+        if heading == 1: return layer[x:x+length, y]
+        if heading == 2: return layer[x, max(y-length+1, 0):y+1][::-1]
+        if heading == 3: return layer[max(x-length+1, 0):x+1, y][::-1]
+    
+    
+    def edge_state(self, location, heading):
+        """ Return the knowledge about one side of a cell: "unknown", "open" or "wall". """
+        
+        bit = 2**heading
+        if not (self.known[location[0], location[1]] & bit):
+            return "unknown"
+        if self.maze[location[0], location[1], 0] & bit:
+            return "wall"
+        return "open"
+    
+    
+    def bound_maze(self, pessimistic=False):
+        """ Copy of the map with every unobserved side treated as open (optimistic) or as a wall (pessimistic). """
+        
+        maze = np.array(self.maze)
+        if pessimistic:
+            maze[:, :, 0] |= 15 & ~self.known
+        else:
+            maze[:, :, 0] &= self.known
+        return maze
+    
+    
+    def route_unknowns(self, plan, location=None, heading=0):
+        """ Follow a plan of (rotation, movement) commands and return the unobserved sides it crosses,
+            as (cell, heading) pairs. """
+        
+        if location == None:
+            location = self.start
+        unknowns = list()
+        for rotation, movement in plan:
+            heading = self.decode_rotation(heading, rotation)
+            transform = self.decode_heading(heading)
+            for cell in range(movement):
+                if self.edge_state(location, heading) == "unknown":
+                    unknowns.append((tuple(location), heading))
+                location = location[0]+transform[0], location[1]+transform[1]
+        return unknowns
+    
+    
+    def plan_end(self, plan, location=None, heading=0):
+        """ Return the cell a plan of (rotation, movement) commands finishes in. """
+        
+        if location == None:
+            location = self.start
+        for rotation, movement in plan:
+            heading = self.decode_rotation(heading, rotation)
+            transform = self.decode_heading(heading)
+            location = location[0]+transform[0]*movement, location[1]+transform[1]*movement
+        return tuple(location)
+    
+    
+    def commit_known(self):
+        """ Stop trusting unobserved sides: mark every side not yet observed as a wall, in place. """
+        
+        self.maze[:, :, 0] |= 15 & ~self.known
+    
+    
+    def maze_fingerprint(self, walls):
+        """ Build a key for the maze from its dimension and the sensor distances at the start cell. """
+        
+        pattern = "_".join("x" if wall < 0 else str(wall) for wall in walls)
+        return "{}x{}_{}".format(self.maze_dim, self.maze_dim, pattern)
+    
+    
+    def knowledge_file(self):
+        """ Path of this algorithm's stored map for the current maze fingerprint. Each algorithm class keeps its own
+            map, so one algorithm's runs never warm start another's. """
+        
+        return os.path.join(self.knowledge_dir, "{}_{}.npz".format(type(self).__name__, self.fingerprint))
+    
+    
+    def load_knowledge(self, maze, walls):
+        """ Fill the map with walls and visits stored by an earlier run on a maze with the same fingerprint. """
+        
+        if not os.path.exists(self.knowledge_file()):
+            return maze
+        stored = np.load(self.knowledge_file())
+        if stored['walls'].shape != maze.shape[:2]:
+            return maze
+        maze[:, :, 0] |= stored['walls']
+        if 'known' in stored.files:
+            self.known |= stored['known']
+        else: # Maps saved before the known layer: only their walls are certain to have been observed.
+            self.known |= stored['walls']
+        if maze.shape[2] > 1:
+            maze[:, :, 1] = np.maximum(maze[:, :, 1], stored['visits'])
+        self.warm_start = True
+        return maze
+    
+    
+    def save_knowledge(self):
+        """ Store the learned walls and visited cells for warm starting later runs on this maze. """
+        
+        if (not self.knowledge_dir) or (self.fingerprint == None):
+            return False
+        if not os.path.isdir(self.knowledge_dir):
+            os.makedirs(self.knowledge_dir)
+        visits = np.zeros(self.maze.shape[:2], dtype=np.uint8)
+        if self.maze.shape[2] > 1:
+            visits = np.minimum(self.maze[:, :, 1], 1)
+        walls = self.maze[:, :, 0] & self.known # Drop the guessed walls commit_known put on unobserved sides.
+        np.savez(self.knowledge_file(), walls=walls, visits=visits, known=self.known)
+        return True
+    
+    
+    def close(self):
+        """ Release anything the algorithm holds once its trial is over. Nothing to release by default. """
+        
+        pass
+    
+    
     def decode_cell(self, cell):
         """ Decode cell wall value and add flag value if not already present. """
         
@@ -162,32 +318,41 @@ class Algorithm(object):
         return self.name
 
 
+    def load_profile(self, maze_dim, filename=None):
+        """ Return tuned parameters for this algorithm and maze size, or an empty dict if none are saved. """
+        if filename == None:
+            filename = profile_file
+        if not os.path.exists(filename):
+            return dict()
+        with open(filename, 'r') as f_in:
+            profile = json.load(f_in)
+        return profile.get(type(self).__name__, dict()).get(str(maze_dim), dict())
+
+
 # ********************************************************************************************************
 
 
 class Waterfall(Algorithm): # Basic waterfall
-    def __init__(self, maze_dim, goal, start = (0, 0)):
+    def __init__(self, maze_dim, goal, start = (0, 0), laps=None):
         super(Waterfall, self).__init__(maze_dim, goal, start)
         # Set state (Exploration / Speed)
         self.name = "Basic Waterfall"
         self.maze = self.blank_maze(maze_dim, map_layers=1, goal=goal)
         self.plan = deque()
-        self.laps = maze_dim - 9
+        if laps == None: # Use the tuned lap count for this maze size if one has been saved.
+            laps = self.load_profile(maze_dim).get('laps', maze_dim - 9)
+        self.laps = laps
         self.current_lap = self.laps
+        self.goal_reached = False
+        self.check_every_step = True # Test exploration_complete every step, rather than only at the end of a lap.
     
     def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
         """ Determine the next action to take in searching for the goal. """
         self.maze = self.update_maze(self.maze, walls, location)
-        if ((self.laps - self.current_lap)%2 == 0) or not self.exploring:
-            target = list(self.goal)
-        else:
-            target = [self.start]
+        target = self.lap_target()
         waterfall = self.waterfall_update(self.maze, target)
         if self.exploring:
-            if (location in target): # If goal has been reached and back at start, end run.
-                self.laps -= 1
-            if self.laps == 0:
-                self.exploring = False
+            if self.end_exploration(location, target):
                 return 'Reset', 'Reset'
             return self.waterfall_choice(waterfall, heading, location)
         else:
@@ -214,6 +379,41 @@ class Waterfall(Algorithm): # Basic waterfall
             return rotation, movement
     
     
+    def load_knowledge(self, maze, walls):
+        """ Load a stored map. With the maze already known, a single lap to the goal is enough exploration. """
+        maze = super(Waterfall, self).load_knowledge(maze, walls)
+        if self.warm_start:
+            self.laps = 1
+            self.current_lap = 1
+        return maze
+
+
+    def end_exploration(self, location, target):
+        """ Count finished laps and decide whether exploration is over: after the last lap, or once
+            exploration_complete shows that more laps cannot shorten run 1. Return True if the run should reset. """
+        location = tuple(location)
+        if location in self.goal:
+            self.goal_reached = True
+        lap_done = location in [tuple(cell) for cell in target]
+        if lap_done: # If goal has been reached and back at start, end run.
+            self.laps -= 1
+        if self.laps == 0:
+            self.exploring = False
+            return True
+        if (self.check_every_step or lap_done) and self.exploration_complete():
+            self.exploring = False
+            self.commit_known() # The speed run must not gamble on sides it has never seen.
+            return True
+        return False
+
+
+    def lap_target(self):
+        """ Exploration laps alternate between the goal and the start. The speed run always targets the goal. """
+        if ((self.laps - self.current_lap)%2 == 0) or not self.exploring:
+            return list(self.goal)
+        return [self.start]
+
+
     def waterfall_choice(self, waterfall, heading, location):
         """ Evaluate the current waterfall map and plan the next action """
         neighbors = self.waterfall_neighbors(waterfall, location)
@@ -247,35 +447,573 @@ class Waterfall(Algorithm): # Basic waterfall
             return [n for n, neighbor in enumerate(neighbors) if neighbor == min(neighbors)]
     
     
-    def waterfall_update(self, maze, goal=None):
+    def route_choice(self, route, heading, max_move, walls=None):
+        """ Convert the start of a cell route into a rotation and movement of up to max_move cells.
+            If sensor distances are given, never move further than the open distance in the new heading. """
+        new_heading = self.cell_heading(route[0], route[1])
+        rotation = self.heading_to_rotation(heading, new_heading)
+        if rotation == "None": # Turn around in two steps.
+            return 90, 0
+        if (walls != None) and (walls[new_heading] >= 0):
+            max_move = min(max_move, walls[new_heading])
+        movement = 1
+        while (movement < max_move) and (movement + 1 < len(route)):
+            if self.cell_heading(route[movement], route[movement + 1]) != new_heading:
+                break
+            movement += 1
+        return rotation, movement
+
+
+    def cell_heading(self, cell, next_cell):
+        """ Heading leading from a cell to an adjacent cell. """
+        for h in range(4):
+            transform = self.decode_heading(h)
+            if (cell[0] + transform[0], cell[1] + transform[1]) == tuple(next_cell):
+                return h
+
+
+    def route_open(self, route):
+        """ True if no mapped wall blocks any step of the route. """
+        for cell, next_cell in zip(route, route[1:]):
+            if 2**self.cell_heading(cell, next_cell) in self.decode_cell(self.maze[cell[0], cell[1], 0]):
+                return False
+        return True
+
+
+    def route_unobserved(self, route):
+        """ True if any step of the route crosses a side that has not been observed. """
+        for cell, next_cell in zip(route, route[1:]):
+            if self.edge_state(cell, self.cell_heading(cell, next_cell)) == "unknown":
+                return True
+        return False
+
+
+    def flood_route(self, maze, location, target):
+        """ Shortest cell route from location to the target through a map, by descending its flood. Empty if the
+            target cannot be reached. """
+        waterfall = self.waterfall_update(maze, target, np.int32)
+        cell = tuple(location)
+        if waterfall[cell[0], cell[1]] == 0:
+            return list()
+        route = [cell]
+        heading = None
+        while waterfall[cell[0], cell[1]] > 1:
+            for h in sorted(range(4), key=lambda h: h != heading): # Keep straight on where the flood allows.
+                transform = self.decode_heading(h)
+                x = cell[0] + transform[0]
+                y = cell[1] + transform[1]
+                if (0 <= x < self.maze_dim) and (0 <= y < self.maze_dim) and not (maze[cell[0], cell[1], 0] & 2**h):
+                    if waterfall[x, y] == waterfall[cell[0], cell[1]] - 1:
+                        cell = (x, y)
+                        heading = h
+                        break
+            route.append(cell)
+        return route
+
+
+    def descents(self, waterfall, walls, location):
+        """ Headings and cells of the open neighbors one step further down the waterfall, through the given walls. """
+        current = waterfall[location[0], location[1]]
+        steps = list()
+        for n in range(4):
+            transform = self.decode_heading(n)
+            x = location[0] + transform[0]
+            y = location[1] + transform[1]
+            if (0 <= x < self.maze_dim) and (0 <= y < self.maze_dim) and not (walls[location[0], location[1]] & 2**n):
+                if 0 < waterfall[x, y] < current:
+                    steps.append((n, (x, y)))
+        return steps
+
+
+    def command_search(self, waterfall, walls, location, heading=0):
+        """ 0-1 breadth first search over (cell, heading, cells in the current command) for the descending route from
+            location needing the fewest commands. Its cost is bounded by the number of states, unlike route_mapper's.
+            A generator: yields None after each expansion, so callers can pause it, and finally the route as a list of
+            (rotation, cell) steps. Yields nothing more if no descending route exists. """
+        # Commands are counted as compress_route counts them: a straight step joins the current command while it
+        # holds fewer than 3 cells, any other step starts a new command.
+        state = (tuple(location), heading, 0)
+        if waterfall[state[0][0], state[0][1]] == 0:
+            return
+        cost = {state: 0}
+        previous = {state: None}
+        queue = deque([state])
+        done = set()
+        while queue:
+            state = queue.popleft()
+            if state in done:
+                continue
+            done.add(state)
+            yield None
+            location, heading, move = state
+            if waterfall[location[0], location[1]] == 1:
+                break
+            for n, cell in self.descents(waterfall, walls, location):
+                rotation = self.heading_to_rotation(heading, n)
+                if rotation == "None":
+                    continue
+                if (rotation == 0) and (move < 3):
+                    new_state, new_cost = (cell, n, move + 1), cost[state]
+                else:
+                    new_state, new_cost = (cell, n, 1), cost[state] + 1
+                if new_cost < cost.get(new_state, float('inf')):
+                    cost[new_state] = new_cost
+                    previous[new_state] = (state, rotation)
+                    if new_cost == cost[state]:
+                        queue.appendleft(new_state)
+                    else:
+                        queue.append(new_state)
+        else:
+            return
+        route = list()
+        while previous[state] != None:
+            cell = state[0]
+            state, rotation = previous[state]
+            route.insert(0, (rotation, cell))
+        yield route
+
+
+    def command_route(self, maze, location, heading, target):
+        """ Cell route from location to the target through a map needing the fewest commands. Empty if the target
+            cannot be reached without turning around first. """
+        waterfall = self.waterfall_update(maze, target, np.int32)
+        route = None
+        for route in self.command_search(waterfall, maze[:, :, 0], location, heading):
+            pass
+        if route == None:
+            return list()
+        return [tuple(location)] + [cell for rotation, cell in route]
+
+
+    def exploration_complete(self):
+        """ True once the goal has been entered and the shortest route through observed open sides is as short as
+            the shortest route with every unobserved side assumed open. No further exploration can improve run 1. """
+        if not self.goal_reached:
+            return False
+        optimistic, pessimistic = self.route_bounds(self.start)
+        return (pessimistic != None) and (optimistic == pessimistic)
+
+
+    def route_bounds(self, location, goal=None):
+        """ Shortest route length from location to the goal with unobserved sides treated as open, and with them
+            treated as walls. The pessimistic bound is None if no route through observed open sides exists. """
+        bounds = list()
+        for pessimistic in [False, True]:
+            waterfall = self.waterfall_update(self.bound_maze(pessimistic), goal, np.int32) # Routes can exceed 255.
+            distance = int(waterfall[location[0], location[1]]) - 1
+            bounds.append(distance if distance >= 0 else None)
+        return tuple(bounds)
+
+
+    def waterfall_update(self, maze, goal=None, dtype=np.uint8):
         """ Update the waterfall map to reflect new information. To return to start, recalcuate the map from start. """
         maze_size = maze.shape[0]
-        center = maze_size // 2
-        waterfall = np.zeros((maze_size, maze_size), dtype=np.uint8)
+        walls = maze[:, :, 0].tolist() # Plain lists and a deque keep the flood fast enough to run every step.
+        distance = [[0] * maze_size for x in range(maze_size)]
         if goal == None:
             goal = self.goal
-        stack = list(goal)
-        for cell in stack:
-            waterfall[cell[0], cell[1]] = 1
-            
-        while len(stack) > 0:
-            loc = stack.pop(0)
-            walls = self.decode_cell(maze[loc[0], loc[1], 0])
-            for i in range(4):
-                transform = self.decode_heading(i)
-                x = loc[0] + transform[0]
-                y = loc[1] + transform[1]
-                if (max((x,y)) < maze_size) and (2**i not in walls):
-                    if waterfall[x, y] == 0:
-                        new_loc = (x, y)
-                        stack.append(new_loc)
-                        waterfall[x, y] = waterfall[loc[0], loc[1]] + 1
-        return waterfall
+        stack = deque()
+        for cell in goal:
+            distance[cell[0]][cell[1]] = 1
+            stack.append(tuple(cell))
+        steps = [(2**i,) + self.decode_heading(i) for i in range(4)]
+
+        while stack:
+            x, y = stack.popleft()
+            for bit, dx, dy in steps:
+                new_x = x + dx
+                new_y = y + dy
+                if (not walls[x][y] & bit) and (0 <= new_x < maze_size) and (0 <= new_y < maze_size):
+                    if distance[new_x][new_y] == 0:
+                        stack.append((new_x, new_y))
+                        distance[new_x][new_y] = distance[x][y] + 1
+        return np.array(distance).astype(dtype)
     
 
 # ********************************************************************************************************
 
 
+class Hierarchical_waterfall(Waterfall): # HPA* style planning over clusters of the known map
+    """
+    Waterfall exploration planned on an abstract graph instead of a full map flood fill. The map is split into
+    square clusters, each open stretch of a cluster border becomes an entrance, and the distances between
+    entrances inside each cluster are cached. Routes are searched on the entrance graph and only refined into
+    cells where the robot is about to travel. New walls only rebuild the clusters they touch.
+
+    Attributes:
+        cluster_size: width in cells of the square clusters
+        links:        border (cluster pair) -> list of entrance cell pairs crossing it
+        crossings:    entrance cell -> cells across a cluster border reachable in one step
+        nodes:        cluster -> set of entrance cells inside it
+        intra:        cluster -> entrance cell -> {entrance cell: distance inside the cluster}
+        route:        cached cell route from the current location, refined one abstract edge at a time
+        abstract:     remaining abstract route, entrance cells still to be refined
+        waypoints:    unobserved sides (cell, heading) on the optimistic shortest route, visited before the lap target
+                      when the lap route itself would cross no unobserved side
+        speed_route:  cell route for the speed run with the fewest commands, from a flood of the committed map
+    """
+    def __init__(self, maze_dim, goal, start = (0, 0), cluster_size=8):
+        super(Hierarchical_waterfall, self).__init__(maze_dim, goal, start)
+        self.name = "Hierarchical Waterfall"
+        self.cluster_size = cluster_size
+        self.cluster_count = (maze_dim + cluster_size - 1) // cluster_size
+        self.links = dict()
+        self.crossings = dict()
+        self.nodes = dict()
+        self.intra = dict()
+        self.route = list()
+        self.abstract = list()
+        self.route_target = None
+        self.waypoints = list()
+        self.speed_route = list()
+        self.check_every_step = False # A full map flood every step would defeat the clusters on large mazes.
+        self.rebuild_clusters([(cx, cy) for cx in range(self.cluster_count) for cy in range(self.cluster_count)])
+
+
+    def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
+        """ Determine the next action to take in searching for the goal. """
+        self.maze = self.update_maze(self.maze, walls, location)
+        location = tuple(location)
+        lap_done = self.exploring and (location in self.lap_target())
+        if self.exploring and self.end_exploration(location, self.lap_target()):
+            return 'Reset', 'Reset'
+        target = self.lap_target()
+        if self.exploring:
+            if lap_done:
+                self.plan_waypoints(location, target)
+            while self.waypoints and ((self.edge_state(*self.waypoints[0]) != "unknown")
+                                      or (location == self.waypoint_cell(self.waypoints[0]))):
+                self.waypoints.pop(0)
+            if self.waypoints:
+                route = self.cluster_route(location, [self.waypoint_cell(self.waypoints[0])])
+                if len(route) >= 2:
+                    return self.route_choice(route, heading, 1)
+                self.waypoints.pop(0) # The waypoint cannot be reached through the known map.
+            route = self.cluster_route(location, target)
+            if len(route) < 2:
+                return 90, 0
+            return self.route_choice(route, heading, 1)
+        # The abstract route is only near optimal, plan the speed run with an exact flood of the committed map.
+        if (location not in self.speed_route) or not self.route_open(self.speed_route):
+            self.speed_route = self.command_route(self.maze, location, heading, target)
+        self.speed_route = self.speed_route[self.speed_route.index(location):] if self.speed_route else list()
+        if len(self.speed_route) < 2:
+            return 90, 0
+        return self.route_choice(self.speed_route, heading, 3, walls)
+
+
+    def plan_waypoints(self, location, target):
+        """ At a lap end, check the next lap's route. If it crosses no unobserved side the lap would teach nothing,
+            so steer it through the unobserved sides of the optimistic shortest route instead. """
+        self.waypoints = list()
+        if self.route_unobserved(self.cluster_route(location, target, refine_all=True)):
+            return
+        route = self.flood_route(self.bound_maze(), location, target)
+        for cell, next_cell in zip(route, route[1:]):
+            if self.edge_state(cell, self.cell_heading(cell, next_cell)) == "unknown":
+                self.waypoints.append((cell, self.cell_heading(cell, next_cell)))
+
+
+    def waypoint_cell(self, waypoint):
+        """ Cell on the far side of a waypoint's unobserved side. Reaching it, or seeing the side, clears the waypoint. """
+        cell, heading = waypoint
+        transform = self.decode_heading(heading)
+        return (cell[0] + transform[0], cell[1] + transform[1])
+
+
+    def update_maze(self, maze, walls, location):
+        """ Update the map, then rebuild the clusters holding any cell whose walls changed. """
+        known = np.array(maze[:, :, 0])
+        maze = super(Hierarchical_waterfall, self).update_maze(maze, walls, location)
+        self.refresh_clusters(known, maze[:, :, 0])
+        return maze
+
+
+    def commit_known(self):
+        """ Mark unobserved sides as walls, then rebuild the clusters holding any cell that changed. """
+        known = np.array(self.maze[:, :, 0])
+        super(Hierarchical_waterfall, self).commit_known()
+        self.refresh_clusters(known, self.maze[:, :, 0])
+
+
+    def refresh_clusters(self, old_walls, new_walls):
+        """ Rebuild the clusters holding any cell whose walls differ between two wall layers. """
+        changed = np.nonzero(old_walls != new_walls)
+        dirty = set((int(x) // self.cluster_size, int(y) // self.cluster_size) for x, y in zip(*changed))
+        if dirty:
+            self.rebuild_clusters(dirty)
+            self.route = list()
+
+
+    def cluster_of(self, cell):
+        return (cell[0] // self.cluster_size, cell[1] // self.cluster_size)
+
+
+    def is_open(self, cell, heading):
+        """ True if the mapped walls allow a move from cell toward heading. """
+        transform = self.decode_heading(heading)
+        x = cell[0] + transform[0]
+        y = cell[1] + transform[1]
+        if (x < 0) or (y < 0) or (max((x, y)) >= self.maze_dim):
+            return False
+        return not (self.maze[cell[0], cell[1], 0] & 2**heading)
+
+
+    def cluster_search(self, cluster, source):
+        """ Breadth first search from source restricted to one cluster. Return distance and parent maps. """
+        distance = {source: 0}
+        parent = {source: None}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            for h in range(4):
+                if not self.is_open(cell, h):
+                    continue
+                transform = self.decode_heading(h)
+                new_cell = (cell[0] + transform[0], cell[1] + transform[1])
+                if (new_cell not in distance) and (self.cluster_of(new_cell) == cluster):
+                    distance[new_cell] = distance[cell] + 1
+                    parent[new_cell] = cell
+                    queue.append(new_cell)
+        return distance, parent
+
+
+    def border_entrances(self, border):
+        """ Find the entrances across the border between two clusters, one per open stretch, at its middle. """
+        cluster, other = border
+        k = self.cluster_size
+        if other[0] != cluster[0]: # East border, cells paired across a vertical wall.
+            heading, along = 1, 0
+            cells = [(cluster[0]*k + k - 1, y) for y in range(cluster[1]*k, min((cluster[1]+1)*k, self.maze_dim))]
+        else: # North border, cells paired across a horizontal wall.
+            heading, along = 0, 1
+            cells = [(x, cluster[1]*k + k - 1) for x in range(cluster[0]*k, min((cluster[0]+1)*k, self.maze_dim))]
+        transform = self.decode_heading(heading)
+        entrances = list()
+        stretch = list()
+        for cell in cells + [None]:
+            if (cell != None) and self.is_open(cell, heading):
+                if stretch: # A stretch continues only while both sides are open along the border.
+                    last = stretch[-1]
+                    across = (last[0] + transform[0], last[1] + transform[1])
+                    if self.is_open(last, along) and self.is_open(across, along):
+                        stretch.append(cell)
+                        continue
+                    middle = stretch[len(stretch) // 2]
+                    entrances.append((middle, (middle[0] + transform[0], middle[1] + transform[1])))
+                stretch = [cell]
+            elif stretch:
+                middle = stretch[len(stretch) // 2]
+                entrances.append((middle, (middle[0] + transform[0], middle[1] + transform[1])))
+                stretch = list()
+        return entrances
+
+
+    def rebuild_clusters(self, dirty):
+        """ Recompute the entrances around the dirty clusters, then the cached distances of every cluster whose
+            walls or entrances changed. """
+        borders = set()
+        for cx, cy in dirty:
+            for other in [(cx+1, cy), (cx, cy+1)]:
+                if max(other) < self.cluster_count:
+                    borders.add(((cx, cy), other))
+            for other in [(cx-1, cy), (cx, cy-1)]:
+                if min(other) >= 0:
+                    borders.add((other, (cx, cy)))
+
+        changed = set(dirty)
+        for border in borders:
+            entrances = self.border_entrances(border)
+            old = self.links.get(border, list())
+            if entrances == old:
+                continue
+            for a, b in old:
+                self.crossings[a].remove(b)
+                self.crossings[b].remove(a)
+            for a, b in entrances:
+                self.crossings.setdefault(a, list()).append(b)
+                self.crossings.setdefault(b, list()).append(a)
+            self.links[border] = entrances
+            changed.update(border)
+
+        for cluster in changed:
+            self.nodes[cluster] = set(cell for cell, across in self.crossings.items()
+                                      if across and (self.cluster_of(cell) == cluster))
+            self.intra[cluster] = dict()
+            for node in self.nodes[cluster]:
+                distance, parent = self.cluster_search(cluster, node)
+                self.intra[cluster][node] = dict((other, distance[other]) for other in self.nodes[cluster]
+                                                 if (other != node) and (other in distance))
+
+
+    def abstract_search(self, location, target):
+        """ Dijkstra search over the entrance graph, with the location and target cells inserted temporarily.
+            Return the abstract route as a list of cells, empty if no target can be reached. """
+        location = tuple(location)
+        target = set(tuple(cell) for cell in target)
+
+        # Link the location and the targets to the entrances of their clusters.
+        start_cluster = self.cluster_of(location)
+        distance, parent = self.cluster_search(start_cluster, location)
+        start_edges = dict((cell, distance[cell]) for cell in self.nodes.get(start_cluster, set()) | target
+                           if cell in distance)
+        target_edges = dict()
+        for cell in target:
+            cluster = self.cluster_of(cell)
+            distance, parent = self.cluster_search(cluster, cell)
+            for node in self.nodes.get(cluster, set()):
+                if node in distance:
+                    target_edges.setdefault(node, dict())[cell] = distance[node]
+
+        best = {location: 0}
+        previous = {location: None}
+        queue = [(0, location)]
+        while queue:
+            cost, cell = heapq.heappop(queue)
+            if cost > best[cell]:
+                continue
+            if cell in target:
+                route = list()
+                while cell != None:
+                    route.append(cell)
+                    cell = previous[cell]
+                route.reverse()
+                return route
+            edges = list(self.intra[self.cluster_of(cell)].get(cell, dict()).items())
+            edges += [(across, 1) for across in self.crossings.get(cell, list())]
+            edges += list(target_edges.get(cell, dict()).items())
+            if cell == location:
+                edges += list(start_edges.items())
+            for new_cell, step in edges:
+                if cost + step < best.get(new_cell, float('inf')):
+                    best[new_cell] = cost + step
+                    previous[new_cell] = cell
+                    heapq.heappush(queue, (cost + step, new_cell))
+        return list()
+
+
+    def refine(self, cell, next_cell):
+        """ Expand one abstract edge into the cells it passes through, excluding the first. """
+        if self.cluster_of(cell) != self.cluster_of(next_cell):
+            return [next_cell]
+        distance, parent = self.cluster_search(self.cluster_of(cell), cell)
+        cells = list()
+        while next_cell != cell:
+            cells.append(next_cell)
+            next_cell = parent[next_cell]
+        cells.reverse()
+        return cells
+
+
+    def cluster_route(self, location, target, refine_all=False):
+        """ Return a cell route from location to the target, reusing the cached route while it is still valid. """
+        location = tuple(location)
+        target = [tuple(cell) for cell in target]
+        if (target != self.route_target) or (location not in self.route):
+            self.abstract = self.abstract_search(location, target)
+            self.route = self.abstract[:1]
+            self.abstract = self.abstract[1:]
+            self.route_target = target
+            if not self.route: # No known route reaches the target.
+                return list()
+        self.route = self.route[self.route.index(location):]
+        while self.abstract and ((len(self.route) < 2) or refine_all):
+            self.route += self.refine(self.route[-1], self.abstract.pop(0))
+        return self.route
+
+
+# ********************************************************************************************************
+
+
+class Bidirectional_waterfall(Waterfall): # Waterfall laps planned by meet in the middle search
+    """
+    Waterfall exploration that replaces the full map flood fill with a breadth first search expanding from the
+    robot and from the lap target at once, stopping where the two waves meet. The resulting route serves the
+    outbound lap, and reversed it is the first candidate for the return lap, so a lap switch only triggers a new
+    search once learned walls block the cached route.
+
+    Attributes:
+        route:        cached cell route from the current location to the lap target
+        return_route: reversed copy of the last outbound route, reused when the lap target switches
+    """
+    def __init__(self, maze_dim, goal, start = (0, 0), laps=None):
+        super(Bidirectional_waterfall, self).__init__(maze_dim, goal, start, laps)
+        self.name = "Bidirectional Waterfall"
+        self.route = list()
+        self.return_route = list()
+        self.expanded = 0
+        self.check_every_step = False # Test exploration_complete only at lap ends, it floods the whole map.
+
+
+    def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
+        """ Determine the next action to take in searching for the goal. """
+        self.maze = self.update_maze(self.maze, walls, location)
+        location = tuple(location)
+        lap_done = self.exploring and (location in self.lap_target())
+        if self.exploring and self.end_exploration(location, self.lap_target()):
+            return 'Reset', 'Reset'
+        if lap_done: # Lap complete, swap to the return route.
+            self.route, self.return_route = self.return_route, list(reversed(self.route))
+            if self.exploring and not self.route_unobserved(self.route):
+                self.route = list() # A fully observed route teaches nothing, search again through unobserved sides.
+        target = [tuple(cell) for cell in self.lap_target()]
+
+        if location in self.route:
+            self.route = self.route[self.route.index(location):]
+        if (location not in self.route) or (self.route[-1] not in target) or not self.route_open(self.route):
+            self.route = self.bidirectional_search(self.maze, [location], target)
+            self.return_route = list(reversed(self.route))
+        if len(self.route) < 2:
+            return 90, 0
+        if self.exploring:
+            return self.route_choice(self.route, heading, 1)
+        return self.route_choice(self.route, heading, 3, walls)
+
+
+    def bidirectional_search(self, maze, sources, targets):
+        """ Breadth first search from the sources and the targets together, one layer at a time from whichever
+            side has the smaller frontier. Return the shortest cell route from a source to a target. """
+        maze_size = maze.shape[0]
+        sides = [dict((tuple(cell), None) for cell in sources), dict((tuple(cell), None) for cell in targets)]
+        frontiers = [list(sides[0]), list(sides[1])]
+        meeting = [cell for cell in sides[0] if cell in sides[1]]
+        while (not meeting) and frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parents = sides[side]
+            layer = list()
+            for loc in frontiers[side]:
+                self.expanded += 1
+                walls = self.decode_cell(maze[loc[0], loc[1], 0])
+                for i in range(4):
+                    transform = self.decode_heading(i)
+                    x = loc[0] + transform[0]
+                    y = loc[1] + transform[1]
+                    if (max((x, y)) < maze_size) and (2**i not in walls) and ((x, y) not in parents):
+                        parents[(x, y)] = loc
+                        layer.append((x, y))
+                        if (x, y) in sides[1 - side]:
+                            meeting.append((x, y))
+            frontiers[side] = layer
+        if not meeting:
+            return list()
+
+        # Every meeting cell in the final layer gives a route of the same length, so any of them will do.
+        route = list()
+        cell = meeting[0]
+        while cell != None:
+            route.append(cell)
+            cell = sides[0][cell]
+        route.reverse()
+        cell = sides[1][meeting[0]]
+        while cell != None:
+            route.append(cell)
+            cell = sides[1][cell]
+        return route
+
+
+# ********************************************************************************************************
+
+
 class Search_waterfall(Waterfall):
     def __init__(self, maze_dim, goal, start = (0, 0)):
         super(Search_waterfall, self).__init__(maze_dim, goal, start)
@@ -287,6 +1025,8 @@ class Search_waterfall(Waterfall):
     
     def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
         """ Determine the next action to take in searching for the goal. """
+        if location in self.goal: # The tester only accepts a reset once the goal has been entered.
+            self.goal_reached = True
         if location in self.target:
             self.target.remove(location)
         if (not self.target) and (location not in self.goal):
@@ -297,62 +1037,74 @@ class Search_waterfall(Waterfall):
             return self.plan.popleft()
         self.maze = self.update_maze(self.maze, walls, location)
         self.maze[location[0], location[1],1] += 1
+        if self.exploration_complete(): # Plan run 1 over observed sides only and stop exploring.
+            self.commit_known()
+            self.target = list(self.goal)
+            plan, final = self.candidate_plan(self.waterfall_update(self.maze, self.goal))
+            if plan and final:
+                self.plan = plan
+                return 'Reset', 'Reset'
         waterfall = self.waterfall_update(self.maze, self.target)
-        routes = self.route_planner(waterfall)            
-        if routes: 
-            potential_plan = min(routes, key=len)
+        potential_plan, final = self.candidate_plan(waterfall)
+        if potential_plan: 
             empty_cells = self.verify_plan(potential_plan)
             if empty_cells:
                 self.target = deque(empty_cells)
-            elif (len(potential_plan) > 1):
+            elif final and (len(potential_plan) > 1) and self.goal_reached and (self.plan_end(potential_plan) in self.goal):
                 self.plan = potential_plan
-                self.target = self.goal
+                self.target = list(self.goal)
                 return 'Reset', 'Reset'
         return self.waterfall_choice(waterfall, heading, location)
 
                       
     def verify_plan(self, plan):
-        """ Check the plan. Return list of spaces in plan that have not been explored """
-        current = deque(plan)
-        location = self.start
-        heading = 0
+        """ Check the plan. Return list of spaces in plan entered through a side that has not been observed """
         empty_cells = list()
-        while current:
-            step = current.popleft()
-            heading = self.decode_rotation(heading, step[0])
+        for location, heading in self.route_unknowns(plan):
             transform = self.decode_heading(heading)
-            for cell in range(step[1]):
-                location = location[0]+transform[0], location[1]+transform[1]
-                if (max(location) < self.maze.shape[0]) and (min(location) >= 0):
-                    if self.maze[location[0], location[1], 1] == 0:
-                        empty_cells.append(location)
+            cell = location[0]+transform[0], location[1]+transform[1]
+            if cell not in empty_cells:
+                empty_cells.append(cell)
         return empty_cells
     
     
+    def candidate_plan(self, waterfall):
+        """ Return the best plan toward the waterfall's targets, and whether it is final. Search_waterfall always
+            finishes its search, subclasses may return an unfinished best so far, which is never used to reset. """
+        routes = self.route_planner(waterfall)
+        if routes:
+            return min(routes, key=len), True
+        return None, True
+    
+    
     def route_planner(self, waterfall):
         """ Convert mapped routes into movement optimized routes. """
         process_stack = self.route_mapper(waterfall, (0,0), 0)
         plan_stack = deque()
         while process_stack:
-            plan = process_stack.popleft()
-            rotate = 0
-            move = 0
-            new_plan = deque()
-            while plan:
-                step = plan.popleft()
-                next_step = (rotate, move)
-                if (step[0] == 0) and move < 3:
-                    move += 1
-                else:
-                    new_plan.append(next_step)
-                    rotate = step[0]
-                    move = step[1]
-            if len(new_plan) > 1:
-                new_plan.append(next_step)
-            plan_stack.append(new_plan)       
+            plan_stack.append(self.compress_route(process_stack.popleft()))
         return plan_stack
     
     
+    def compress_route(self, plan):
+        """ Merge the single cell steps of a mapped route into commands of up to 3 cells. """
+        rotate = 0
+        move = 0
+        new_plan = deque()
+        while plan:
+            step = plan.popleft()
+            next_step = (rotate, move)
+            if (step[0] == 0) and move < 3:
+                move += 1
+            else:
+                new_plan.append(next_step)
+                rotate = step[0]
+                move = step[1]
+        if move > 1: # The closing (0, 0) step added one to a pending command, which is not yet in the plan.
+            new_plan.append(next_step)
+        return new_plan
+    
+    
     def route_mapper(self, waterfall, location, heading):
         """ Recursively generate all descending routes from start to goal. """
         neighbors = self.waterfall_neighbors(waterfall, location, True)
@@ -379,6 +1131,333 @@ class Search_waterfall(Waterfall):
 # ********************************************************************************************************
 
 
+class Anytime_waterfall(Search_waterfall): # Search_waterfall with a time budget on every decision
+    """
+    Search_waterfall whose route search runs as an anytime search in a background thread. Each decision waits for the
+    search at most until its share of the time budget is spent, then acts on the best plan found so far. The search
+    keeps improving that plan between steps and is only restarted when the waterfall or the walls it searches change.
+    Floods are reused while the map is unchanged, and the exploration_complete check is deferred to a later decision
+    once the search share of the budget is spent. A speed run is committed to (by a Reset) once its search has
+    finished, or with the best plan so far once plan_budget seconds have passed since exploration completed.
+
+    Attributes:
+        time_budget:     seconds allowed for each decision
+        plan_budget:     seconds the speed run search may take after exploration is complete
+        search_share:    fraction of the budget a decision may spend on floods and waiting for the route search
+        search_batch:    route search expansions per hold of the search lock
+        decisions:       decisions made so far
+        deadline_misses: decisions that took longer than the time budget
+        unfinished:      decisions that acted before the route search finished
+        worst_decision:  longest decision so far, in seconds
+    """
+    def __init__(self, maze_dim, goal, start = (0, 0), time_budget=0.01, plan_budget=1.0):
+        super(Anytime_waterfall, self).__init__(maze_dim, goal, start)
+        self.name = "Anytime Waterfall"
+        self.time_budget = time_budget
+        self.plan_budget = plan_budget
+        self.search_share = 0.8
+        self.search_batch = 50
+        self.deadline = None
+        self.floods = dict()
+        self.complete_key = None
+        self.complete = False
+        self.complete_since = None
+        # Route search state, shared with the background thread under search_lock.
+        self.search_lock = threading.Lock()
+        self.work = threading.Event()
+        self.search_done = threading.Event()
+        self.searcher = None
+        self.search_key = None
+        self.search = None
+        self.best_plan = None
+        self.stopped = False
+        # Instrumentation
+        self.decisions = 0
+        self.deadline_misses = 0
+        self.unfinished = 0
+        self.decision_time = 0.
+        self.worst_decision = 0.
+        self.final_search = None
+        self.final_plan = None
+
+
+    def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
+        """ Decide as Search_waterfall within the time budget, timing the decision. """
+        started = time.time()
+        self.deadline = started + self.search_share * self.time_budget
+        committed = bool(self.plan) # Popping a committed plan is not a planning decision.
+        self.work.clear() # Pause the search while the decision needs the interpreter.
+        rotation, movement = super(Anytime_waterfall, self).algorithm_choice(walls, heading, location)
+        if rotation == 'Reset':
+            self.stop_search()
+        self.resume_search()
+        elapsed = time.time() - started
+        if not committed:
+            self.decisions += 1
+            self.decision_time += elapsed
+            self.worst_decision = max(self.worst_decision, elapsed)
+            if elapsed > self.time_budget:
+                self.deadline_misses += 1
+        return rotation, movement
+
+
+    def waterfall_update(self, maze, goal=None, dtype=np.uint8):
+        """ Reuse the flood of an unchanged map toward the same goal from an earlier call. """
+        if goal == None:
+            goal = self.goal
+        key = (maze[:, :, 0].tobytes(), tuple(tuple(cell) for cell in goal), dtype)
+        if key not in self.floods:
+            if len(self.floods) > 16:
+                self.floods.clear()
+            self.floods[key] = super(Anytime_waterfall, self).waterfall_update(maze, goal, dtype)
+        return np.array(self.floods[key]) # A copy, so callers cannot change the cached flood.
+
+
+    def exploration_complete(self):
+        """ As Waterfall, but reuse the answer while the map is unchanged, and leave a changed map for a later decision
+            once this decision's search share of the budget is spent. """
+        if not self.goal_reached:
+            return False
+        key = self.maze[:, :, 0].tobytes() + self.known.tobytes()
+        if key != self.complete_key:
+            if time.time() > self.deadline:
+                return False
+            self.complete_key = key
+            self.complete = super(Anytime_waterfall, self).exploration_complete()
+        if self.complete and (self.complete_since == None):
+            self.complete_since = time.time()
+        return self.complete
+
+
+    def candidate_plan(self, waterfall):
+        """ Return the best plan found so far toward the waterfall's targets, and whether it is final. A plan is final
+            once its search finished, or once plan_budget has run out after exploration completed. A new waterfall
+            or wall layer replaces the running search, the same pair lets it continue. """
+        walls = np.array(self.maze[:, :, 0])
+        key = waterfall.tobytes() + walls.tobytes()
+        with self.search_lock:
+            if key != self.search_key:
+                self.search_key = key
+                self.search = self.route_search(np.array(waterfall), walls)
+                self.best_plan = None
+                self.search_done.clear()
+        if self.searcher == None:
+            self.searcher = threading.Thread(target=self.background_search)
+            self.searcher.daemon = True
+            self.searcher.start()
+        self.resume_search()
+        self.search_done.wait(max(0., self.deadline - time.time()))
+        with self.search_lock:
+            self.work.clear()
+            finished = self.search_done.is_set()
+            plan = deque(self.best_plan) if self.best_plan != None else None
+        if not finished:
+            self.unfinished += 1
+            if (self.complete_since != None) and (time.time() - self.complete_since > self.plan_budget):
+                finished = True
+        if finished:
+            self.final_search = (np.array(waterfall), walls)
+            self.final_plan = deque(plan) if plan != None else None
+        return plan, finished
+
+
+    def background_search(self):
+        """ Search thread: advance the current route search in batches until it finishes or the search is stopped. """
+        while self.work.wait():
+            with self.search_lock:
+                if self.stopped:
+                    return
+                for i in range(self.search_batch):
+                    plan = next(self.search, False)
+                    if plan is False:
+                        self.search_done.set()
+                        self.work.clear()
+                        break
+                    if plan != None:
+                        self.best_plan = plan
+            time.sleep(0) # Hand the interpreter back to a waiting decision between batches.
+
+
+    def resume_search(self):
+        """ Let the background search continue, unless it has finished or been stopped. """
+        with self.search_lock:
+            if (self.search != None) and not (self.search_done.is_set() or self.stopped):
+                self.work.set()
+
+
+    def stop_search(self):
+        """ End the background search, the speed run needs no further planning. """
+        with self.search_lock:
+            self.stopped = True
+            self.work.set()
+
+
+    def close(self):
+        """ Stop the background search and wait for its thread, so no search outlives the trial. """
+        self.stop_search()
+        if self.searcher != None:
+            self.searcher.join()
+            self.searcher = None
+
+
+    def route_search(self, waterfall, walls):
+        """ Anytime form of route_planner over a snapshot of the wall layer, yielding None after each expansion so the
+            search can be paused at any point, and each better compressed plan as it is found.
+            A greedy descent that keeps straight where it can gives the first plan, then command_search finds the
+            descending route needing the fewest commands, which ends the search. """
+        start = tuple(self.start)
+        if waterfall[start[0], start[1]] == 0:
+            return
+        location, heading, steps = start, 0, list()
+        while waterfall[location[0], location[1]] != 1:
+            yield None
+            options = self.descents(waterfall, walls, location)
+            n, location = next(((n, cell) for n, cell in options if n == heading), options[0])
+            if n == (heading + 2) % 4: # Turn around in place before moving.
+                steps.append((90, 0))
+                heading = (heading + 1) % 4
+            steps.append((self.heading_to_rotation(heading, n), 1))
+            heading = n
+        best = self.compress_route(deque(steps + [(0, 0)]))
+        yield deque(best)
+
+        route = None
+        for route in self.command_search(waterfall, walls, start):
+            if route == None:
+                yield None
+        if route == None:
+            return
+        plan = self.compress_route(deque([(rotation, 1) for rotation, cell in route] + [(0, 0)]))
+        if len(plan) < len(best):
+            yield deque(plan)
+
+
+    def latency_report(self):
+        """ Summarize decision latency, and compare the committed plan with the same search run without a budget. """
+        report = {"decisions": self.decisions, "deadline_misses": self.deadline_misses,
+                  "unfinished": self.unfinished, "worst_decision": self.worst_decision,
+                  "mean_decision": self.decision_time / self.decisions if self.decisions else None,
+                  "plan": None, "unbounded_plan": None}
+        if self.final_plan:
+            report["plan"] = len(self.final_plan)
+            plans = [plan for plan in self.route_search(*self.final_search) if plan != None]
+            if plans:
+                report["unbounded_plan"] = len(plans[-1])
+        return report
+
+
+# ********************************************************************************************************
+
+
+class Corridor_waterfall(Search_waterfall): # Search_waterfall planning on the corridor compressed junction graph
+    def __init__(self, maze_dim, goal, start = (0, 0)):
+        super(Corridor_waterfall, self).__init__(maze_dim, goal, start)
+        self.name = "Corridor Waterfall"
+        self.corridors = Corridor_graph(self.maze[:, :, 0], keep=[start] + list(goal))
+
+
+    def update_maze(self, maze, walls, location):
+        """ Update the map, then rebuild the corridor edges through any cell whose walls changed. """
+        known = np.array(maze[:, :, 0])
+        maze = super(Corridor_waterfall, self).update_maze(maze, walls, location)
+        changed = np.nonzero(known != maze[:, :, 0])
+        if len(changed[0]):
+            self.corridors.update(zip(*changed))
+        return maze
+
+
+    def commit_known(self):
+        """ Mark unobserved sides as walls, then rebuild the corridor edges through the cells that changed. """
+        known = np.array(self.maze[:, :, 0])
+        super(Corridor_waterfall, self).commit_known()
+        changed = np.nonzero(known != self.maze[:, :, 0])
+        if len(changed[0]):
+            self.corridors.update(zip(*changed))
+
+
+    def route_planner(self, waterfall):
+        """ Plan from the start to the waterfall's target cells over junctions instead of enumerating every
+            descending route cell by cell. Return a deque holding the single best plan. """
+        target = [(x, y) for x, y in zip(*np.nonzero(waterfall == 1))]
+        runs = self.corridors.shortest_route(self.start, target)
+        if runs == None:
+            return deque()
+        return deque([self.corridors.route_commands(runs)])
+
+
+# ********************************************************************************************************
+
+
+class Timed_waterfall(Search_waterfall): # Speed run planned for estimated time rather than command count
+    def __init__(self, maze_dim, goal, start = (0, 0), motion_model=None):
+        super(Timed_waterfall, self).__init__(maze_dim, goal, start)
+        self.name = "Timed Waterfall"
+        if motion_model == None:
+            motion_model = Accelerated_motion()
+        self.motion_model = motion_model
+
+
+    def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
+        """ Explore as Search_waterfall, then replace its speed run with the fastest route under the motion model. """
+        rotation, movement = super(Timed_waterfall, self).algorithm_choice(walls, heading, location)
+        if rotation == 'Reset':
+            plan = self.timed_planner(self.bound_maze(pessimistic=True), self.start, 0, self.goal)
+            if plan:
+                self.plan = plan
+        return rotation, movement
+
+
+    def timed_planner(self, maze, start, heading, goal):
+        """ Find the route minimizing estimated time through the given map. Return it as a deque of commands.
+            Search states are cells the robot stops in, with its heading. Each step turns (or, leaving the start,
+            keeps heading) and then drives a straight run of any length, timed as one run by the motion model. """
+        maze_size = maze.shape[0]
+        goal = [tuple(cell) for cell in goal]
+        best = {(tuple(start), heading): 0}
+        previous = dict()
+        queue = [(0, tuple(start), heading)]
+        while queue:
+            time, location, heading = heapq.heappop(queue)
+            if time > best[(location, heading)]:
+                continue
+            if location in goal:
+                break
+            for rotation in [-90, 0, 90]:
+                if (rotation == 0) and (location != tuple(start)):
+                    continue # Straight on from a stop is never faster than extending the previous run.
+                new_heading = self.decode_rotation(heading, rotation)
+                transform = self.decode_heading(new_heading)
+                x, y = location
+                for cells in range(1, maze_size):
+                    if 2**new_heading in self.decode_cell(maze[x, y, 0]):
+                        break
+                    x += transform[0]
+                    y += transform[1]
+                    if (max((x, y)) >= maze_size) or (min((x, y)) < 0):
+                        break
+                    new_time = time + self.motion_model.turn_time(rotation) + self.motion_model.straight_time(cells)
+                    if new_time < best.get(((x, y), new_heading), float('inf')):
+                        best[((x, y), new_heading)] = new_time
+                        previous[((x, y), new_heading)] = (location, heading, rotation, cells)
+                        heapq.heappush(queue, (new_time, (x, y), new_heading))
+        else:
+            return deque()
+
+        # Walk back from the goal, splitting each straight run into commands of at most 3 cells.
+        plan = deque()
+        state = (location, heading)
+        while state in previous:
+            location, heading, rotation, cells = previous[state]
+            run = [(0, 3)] * ((cells - 1) // 3) + [(0, (cells - 1) % 3 + 1)]
+            run[0] = (rotation, run[0][1])
+            plan.extendleft(reversed(run))
+            state = (location, heading)
+        return plan
+
+
+# ********************************************************************************************************
+
+
 class Oracle_waterfall(Search_waterfall): # Perfect score by knowing the maze
     def __init__(self, maze_dim, goal, start = (0, 0)):
         super(Oracle_waterfall, self).__init__(maze_dim, goal, start)
@@ -0,0 +1,196 @@
+from maze import Maze
+from algorithms import Waterfall, Anytime_waterfall
+from robot import Robot
+from tester import maze_goal, train_score_mult, max_time
+from multiprocessing import Process, Queue, Lock, shared_memory
+import numpy as np
+import argparse
+import time
+
+# Map between the algorithms' integer headings and the maze's direction names.
+directions = ['up', 'right', 'down', 'left']
+
+
+class Shared_waterfall(Waterfall):
+    """
+    Waterfall explorer whose map lives in a shared memory block, so several explorers running in
+    separate processes map one maze together.
+
+    Attributes:
+        shm:   handle on the shared memory block holding the maze array (layer 0 walls, layer 1 visits),
+               followed by the known layer
+        lock:  multiprocessing lock serializing read-modify-write updates to the shared block
+    """
+    def __init__(self, maze_dim, goal, start, shm_name, lock):
+        super(Shared_waterfall, self).__init__(maze_dim, goal, start)
+        self.name = "Shared Waterfall"
+        self.shm = shared_memory.SharedMemory(name=shm_name)
+        self.maze = np.ndarray((maze_dim, maze_dim, 2), dtype=np.uint8, buffer=self.shm.buf)
+        self.known = np.ndarray((maze_dim, maze_dim), dtype=np.uint8, buffer=self.shm.buf, offset=maze_dim*maze_dim*2)
+        self.lock = lock
+
+
+    def algorithm_choice(self, walls = list(), heading=0, location = (0, 0)):
+        """ Move toward the nearest cell no explorer has visited yet. Stop when none remain reachable. """
+        self.maze = self.update_maze(self.maze, walls, location)
+        with self.lock:
+            self.maze[location[0], location[1], 1] += 1 # Update visits to the current cell
+        frontier = [(x, y) for x, y in zip(*np.nonzero(self.maze[:, :, 1] == 0))]
+        if not frontier:
+            return 'Reset', 'Reset'
+        waterfall = self.waterfall_update(self.maze, frontier)
+        if waterfall[location[0], location[1]] == 0: # Remaining unvisited cells are walled off from this explorer.
+            return 'Reset', 'Reset'
+        return self.waterfall_choice(waterfall, heading, location)
+
+
+    def update_maze(self, maze, walls, location):
+        """ Bit-OR current sensor data into the shared map. The lock makes each ray write atomic across explorers. """
+        with self.lock:
+            return super(Shared_waterfall, self).update_maze(maze, walls, location)
+
+
+    def close(self):
+        """ Detach from the shared block. The process that created it is responsible for unlinking. """
+        self.maze = np.array(self.maze)
+        self.known = np.array(self.known)
+        self.shm.close()
+
+
+def explore(maze_file, start, heading, shm_name, lock, results):
+    """ Explorer process: drive one robot through the maze until no unvisited cells remain for it.
+        Always reports back, with the error message if the explorer failed, so the parent never waits forever. """
+    algorithm = None
+    error = None
+    steps = 0
+    started = time.time()
+    try:
+        testmaze = Maze(maze_file)
+        maze_dim = testmaze.get_dim()
+        algorithm = Shared_waterfall(maze_dim, maze_goal(maze_dim), start, shm_name, lock)
+        testrobot = Robot(maze_dim, algorithm)
+        testrobot.location = tuple(start)
+        testrobot.heading = heading
+        location = list(start)
+
+        while steps < max_time:
+            steps += 1
+            sensing = [testmaze.dist_to_wall(location, directions[(testrobot.heading + i) % 4]) for i in (3, 0, 1)]
+            rotation, movement = testrobot.next_move(sensing)
+            if rotation == 'Reset':
+                break
+            for i in range(movement):
+                if not testmaze.is_permissible(location, directions[testrobot.heading]):
+                    raise Exception('Explorer starting at {} drove into a wall at {}!'.format(start, location))
+                transform = algorithm.decode_heading(testrobot.heading)
+                location[0] += transform[0]
+                location[1] += transform[1]
+    except Exception as e:
+        error = str(e)
+    finally:
+        if algorithm != None:
+            algorithm.close()
+        results.put((tuple(start), steps, time.time() - started, error))
+
+
+def true_walls(testmaze):
+    """ Encode the maze's walls in the algorithms' wall bit format. """
+    maze_dim = testmaze.get_dim()
+    walls = np.zeros((maze_dim, maze_dim), dtype=np.uint8)
+    for x in range(maze_dim):
+        for y in range(maze_dim):
+            for w in range(4):
+                if not testmaze.is_permissible([x, y], directions[w]):
+                    walls[x, y] += 2**w
+    return walls
+
+
+def speed_run(testmaze, walls):
+    """ Plan the speed run over a learned wall map. Return the plan, or None if it hits an unmapped wall. """
+    maze_dim = testmaze.get_dim()
+    planner = Anytime_waterfall(maze_dim, maze_goal(maze_dim))
+    planner.maze[:, :, 0] = walls
+    # Run the bounded route search to completion, route_planner would enumerate every route of an open map.
+    plans = [plan for plan in planner.route_search(planner.waterfall_update(planner.maze), walls) if plan != None]
+    if not plans:
+        return None
+    plan = plans[-1]
+
+    # Drive the plan through the real maze to confirm every move is legal.
+    location = [0, 0]
+    heading = 0
+    for rotation, movement in plan:
+        heading = planner.decode_rotation(heading, rotation)
+        for i in range(movement):
+            if not testmaze.is_permissible(location, directions[heading]):
+                return None
+            transform = planner.decode_heading(heading)
+            location[0] += transform[0]
+            location[1] += transform[1]
+    return plan
+
+
+def cooperative_exploration(maze_file, robots=4):
+    """ Explore a maze with several robots sharing one map, then plan the single robot speed run from it. """
+    testmaze = Maze(maze_file)
+    maze_dim = testmaze.get_dim()
+    corners = [((0, 0), 0), ((maze_dim-1, maze_dim-1), 2), ((maze_dim-1, 0), 0), ((0, maze_dim-1), 2)]
+    starts = [corners[i % len(corners)] for i in range(robots)]
+
+    shm = shared_memory.SharedMemory(create=True, size=maze_dim*maze_dim*3)
+    try:
+        # Initialize the shared map and known layer with the outer walls every algorithm starts from.
+        shared = np.ndarray((maze_dim, maze_dim, 2), dtype=np.uint8, buffer=shm.buf)
+        known = np.ndarray((maze_dim, maze_dim), dtype=np.uint8, buffer=shm.buf, offset=maze_dim*maze_dim*2)
+        shared[:, :, :] = Waterfall(maze_dim, maze_goal(maze_dim)).blank_maze(maze_dim, 2, None)
+        known[:, :] = shared[:, :, 0]
+        lock = Lock()
+        results = Queue()
+        started = time.time()
+        explorers = [Process(target=explore, args=(maze_file, start, heading, shm.name, lock, results))
+                     for start, heading in starts]
+        for explorer in explorers:
+            explorer.start()
+        explorer_steps = [results.get() for explorer in explorers]
+        for explorer in explorers:
+            explorer.join()
+        errors = [error for start, steps, seconds, error in explorer_steps if error != None]
+        if errors:
+            raise Exception("Explorer failed: {}".format("; ".join(errors)))
+        explorer_steps = [(start, steps, seconds) for start, steps, seconds, error in explorer_steps]
+        elapsed = time.time() - started
+        walls = np.array(shared[:, :, 0])
+        visited = np.count_nonzero(shared[:, :, 1])
+        del shared, known
+    finally:
+        shm.close()
+        shm.unlink()
+
+    truth = true_walls(testmaze)
+    plan = speed_run(testmaze, walls)
+    return {"explorer_steps": sorted(explorer_steps),
+            "exploration_time": max(steps for start, steps, seconds in explorer_steps),
+            "elapsed": elapsed,
+            "visited": visited / float(maze_dim**2),
+            "mapped": np.array_equal(walls, truth),
+            "speed_run": len(plan) if plan != None else None}
+
+
+if __name__ == '__main__':
+    """ Compare cooperative exploration with increasing robot counts on a maze given as an argument. """
+    parser = argparse.ArgumentParser(description="Cooperative multi-robot exploration over a shared map.")
+    parser.add_argument('maze', nargs='?', default="test_maze_01.txt", help="maze file to explore")
+    parser.add_argument('--robots', type=int, default=4, help="largest number of explorers to run")
+    args = parser.parse_args()
+
+    print("*"*30)
+    for robots in range(1, args.robots + 1):
+        result = cooperative_exploration(args.maze, robots)
+        print("{} robot(s): mapped in {} steps ({:.3f}s), {:.0%} of cells visited, map complete: {}".format(
+            robots, result["exploration_time"], result["elapsed"], result["visited"], result["mapped"]))
+        if result["speed_run"] != None:
+            print("    Speed run {} steps. Score: {:4.3f}".format(
+                result["speed_run"], result["speed_run"] + train_score_mult*result["exploration_time"]))
+        else:
+            print("    Speed run plan crosses an unmapped wall.")
+    print("*"*30)
@@ -0,0 +1,209 @@
+from collections import deque
+import heapq
+
+# Coordinate transformation for each heading, North, East, South, West respectively.
+transforms = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
+
+class Corridor_graph(object):
+    """
+    Junction graph of a wall map. Runs of cells with exactly two openings are collapsed into single weighted
+    edges between junctions, so searches and route compression only visit junctions.
+
+    Attributes:
+        walls:     uint8 numpy array of wall bits per cell, read live from the algorithm's map
+        keep:      cells always treated as junctions, such as the start and goal cells
+        max_move:  most cells the robot may move in one command
+        edges:     junction -> heading leaving it -> (end junction, cells after the junction, heading of each step,
+                   straight runs of the edge as (heading, cells), commands needed by every run after the first)
+        passing:   interior cell -> set of (junction, heading) edges passing through it
+        junctions: set of all junction cells
+    """
+    def __init__(self, walls, keep=(), max_move=3):
+        self.walls = walls
+        self.maze_dim = walls.shape[0]
+        self.max_move = max_move
+        self.keep = set(tuple(cell) for cell in keep)
+        self.edges = dict()
+        self.passing = dict()
+        self.junctions = set()
+        self.expanded = 0
+        self.update([(x, y) for x in range(self.maze_dim) for y in range(self.maze_dim)])
+
+
+    def openings(self, cell):
+        """ Headings in which a cell is open to a neighbor. """
+        return [h for h in range(4) if not (self.walls[cell[0], cell[1]] & 2**h)
+                and (0 <= cell[0] + transforms[h][0] < self.maze_dim)
+                and (0 <= cell[1] + transforms[h][1] < self.maze_dim)]
+
+
+    def is_junction(self, cell):
+        return (cell in self.keep) or (len(self.openings(cell)) != 2)
+
+
+    def walk(self, junction, heading):
+        """ Follow a corridor from a junction until the next junction. Return the end, cells and step headings. """
+        cells = list()
+        headings = list()
+        cell = junction
+        while True:
+            cell = (cell[0] + transforms[heading][0], cell[1] + transforms[heading][1])
+            cells.append(cell)
+            headings.append(heading)
+            if (cell in self.junctions) or (cell == junction):
+                return cell, cells, headings
+            heading = [h for h in self.openings(cell) if h != (heading + 2) % 4][0]
+
+
+    def remove_edge(self, junction, heading):
+        """ Drop an edge and its reverse from the graph. Return the two junctions it connected. """
+        end, cells, headings, runs, inner = self.edges[junction].pop(heading)
+        for cell in cells[:-1]:
+            self.passing[cell].discard((junction, heading))
+        reverse = (headings[-1] + 2) % 4
+        if (end in self.edges) and (reverse in self.edges[end]):
+            end_cells = self.edges[end].pop(reverse)[1]
+            for cell in end_cells[:-1]:
+                self.passing[cell].discard((end, reverse))
+        return junction, end
+
+
+    def add_edges(self, junction):
+        """ Walk every open heading of a junction not already covered by an edge, storing both directions. """
+        for heading in self.openings(junction):
+            if heading in self.edges[junction]:
+                continue
+            end, cells, headings = self.walk(junction, heading)
+            self.edges[junction][heading] = (end, cells, headings) + self.run_costs(headings)
+            for cell in cells[:-1]:
+                self.passing.setdefault(cell, set()).add((junction, heading))
+            reverse = (headings[-1] + 2) % 4
+            back_cells = list(reversed([junction] + cells[:-1]))
+            back_headings = [(h + 2) % 4 for h in reversed(headings)]
+            self.edges.setdefault(end, dict())[reverse] = (junction, back_cells, back_headings) + self.run_costs(back_headings)
+            for cell in back_cells[:-1]:
+                self.passing.setdefault(cell, set()).add((end, reverse))
+
+
+    def update(self, cells):
+        """ Rebuild the part of the graph touched by cells whose walls changed. """
+        cells = set(tuple(int(c) for c in cell) for cell in cells)
+        rewalk = set()
+        for cell in cells:
+            for junction, heading in list(self.passing.get(cell, set())):
+                if heading in self.edges.get(junction, dict()):
+                    rewalk.update(self.remove_edge(junction, heading))
+            for heading in list(self.edges.get(cell, dict())):
+                if heading in self.edges[cell]:
+                    rewalk.update(self.remove_edge(cell, heading))
+        for cell in cells:
+            if self.is_junction(cell):
+                self.junctions.add(cell)
+                self.edges.setdefault(cell, dict())
+            else:
+                self.junctions.discard(cell)
+                self.edges.pop(cell, None)
+            rewalk.add(cell)
+        for junction in rewalk:
+            if junction in self.junctions:
+                self.add_edges(junction)
+
+
+    def run_costs(self, headings):
+        """ Group step headings into straight (heading, cells) runs. Return the runs and the commands needed by every
+            run after the first, which do not depend on how the robot arrives. """
+        runs = list()
+        for heading in headings:
+            if runs and (runs[-1][0] == heading):
+                runs[-1] = (heading, runs[-1][1] + 1)
+            else:
+                runs.append((heading, 1))
+        inner = sum((cells + self.max_move - 1) // self.max_move for heading, cells in runs[1:])
+        return runs, inner
+
+
+    def drive_runs(self, heading, run, runs, inner):
+        """ Commands added by driving straight runs when the robot arrives facing heading, with its last command
+            holding run cells. Return them with the heading and last command length at the end of the runs. """
+        first, cells = runs[0]
+        if (first == heading) and (0 < run < self.max_move): # The first run extends the last command.
+            commands = (max(0, cells - (self.max_move - run)) + self.max_move - 1) // self.max_move
+            end_run = (run + cells - 1) % self.max_move + 1
+        else:
+            commands = (cells + self.max_move - 1) // self.max_move
+            if first == (heading + 2) % 4: # Turn around in place before moving.
+                commands += 1
+            end_run = (cells - 1) % self.max_move + 1
+        if len(runs) > 1:
+            end_run = (runs[-1][1] - 1) % self.max_move + 1
+        return commands + inner, runs[-1][0], end_run % self.max_move # A full command extends like no command.
+
+
+    def shortest_route(self, start, goal, heading=0):
+        """ Dijkstra search over junctions from a start junction to any goal cell, preferring fewer commands and then
+            fewer cells. States carry the heading and the cells in the last command, so a straight run continuing
+            into the next edge is counted as route_commands will drive it. Goals inside a corridor end the route part
+            way along its edge. Return the route as a list of straight (heading, cells) runs, None if no goal is
+            reachable. """
+        goal = set(tuple(cell) for cell in goal)
+        stops = dict() # Edge -> position of the first goal cell along it.
+        for cell in goal:
+            for junction, out in self.passing.get(cell, set()):
+                stop = self.edges[junction][out][1].index(cell)
+                stops[(junction, out)] = min(stop, stops.get((junction, out), stop))
+        state = (tuple(start), heading, 0)
+        best = {state: (0, 0)}
+        previous = {state: None}
+        queue = [(0, 0, state)]
+        while queue:
+            commands, length, state = heapq.heappop(queue)
+            if (commands, length) > best[state]:
+                continue
+            self.expanded += 1
+            cell, heading, run = state
+            if cell in goal:
+                route = list()
+                while previous[state] != None:
+                    state, runs = previous[state]
+                    route = runs + route
+                merged = list()
+                for step, cells in route: # Join runs continuing straight across a junction.
+                    if merged and (merged[-1][0] == step):
+                        merged[-1] = (step, merged[-1][1] + cells)
+                    else:
+                        merged.append((step, cells))
+                return merged
+            for out, (end, cells, headings, runs, inner) in self.edges.get(cell, dict()).items():
+                steps = len(cells)
+                if (cell, out) in stops:
+                    steps = stops[(cell, out)] + 1
+                    end = cells[steps - 1]
+                    runs, inner = self.run_costs(headings[:steps])
+                added, new_heading, new_run = self.drive_runs(heading, run, runs, inner)
+                new_state = (end, new_heading, new_run)
+                new_cost = (commands + added, length + steps)
+                if new_cost < best.get(new_state, (float('inf'), 0)):
+                    best[new_state] = new_cost
+                    previous[new_state] = (state, runs)
+                    heapq.heappush(queue, (new_cost[0], new_cost[1], new_state))
+        return None
+
+
+    def route_commands(self, runs, heading=0):
+        """ Compress straight (heading, cells) runs into (rotation, movement) commands of at most max_move cells. """
+        plan = deque()
+        for step, cells in runs:
+            if plan and (step == heading) and (0 < plan[-1][1] < self.max_move):
+                extend = min(cells, self.max_move - plan[-1][1])
+                plan[-1] = (plan[-1][0], plan[-1][1] + extend)
+                cells -= extend
+            elif step == (heading + 2) % 4: # Turn around in place before moving.
+                plan.append((90, 0))
+                heading = (heading + 1) % 4
+            while cells > 0:
+                movement = min(cells, self.max_move)
+                plan.append(({0: 0, 1: 90, 3: -90}[(step - heading) % 4], movement))
+                heading = step
+                cells -= movement
+        return plan
@@ -0,0 +1,102 @@
+import math
+
+class Motion_model(object):
+    """
+    Time cost of robot commands. The base model charges one time step per command, matching the tester's scoring.
+
+    Attributes:
+        run_cells: cells covered by the current straight run, consecutive forward commands without rotation
+        elapsed:   estimated time used so far in the current run of the trial
+        runtimes:  estimated time of each completed run of the trial
+    """
+    def __init__(self):
+        self.name = "Unit Steps"
+        self.start_trial()
+
+
+    def start_trial(self):
+        """ Clear the time recorded for earlier trials. """
+        self.runtimes = []
+        self.start_run()
+
+
+    def start_run(self):
+        """ Begin a run with the robot at rest. """
+        self.elapsed = 0
+        self.run_cells = 0
+
+
+    def end_run(self):
+        """ Record the estimated time of the current run. """
+        self.runtimes.append(self.elapsed)
+
+
+    def record(self, rotation, movement):
+        """ Charge the time for one command. movement is the number of cells actually moved, negative for reverse. """
+        self.elapsed += self.command_time(rotation, movement)
+
+
+    def command_time(self, rotation, movement):
+        """ Time needed for one command. """
+        return 1
+
+
+    def turn_time(self, rotation):
+        """ Time needed to rotate in place. """
+        return 0
+
+
+    def straight_time(self, cells):
+        """ Time needed to cover a straight run of cells starting and ending at rest. """
+        return int(math.ceil(cells / 3.))
+
+
+    def get_name(self):
+        return self.name
+
+
+class Accelerated_motion(Motion_model):
+    """
+    Motion model of a robot with bounded acceleration and speed. Straight runs follow a trapezoidal speed profile
+    and continue across consecutive forward commands, every rotation stops the robot and costs a turn penalty.
+
+    Attributes:
+        acceleration: speed gained (or lost when braking) per time step, in cells per time step squared
+        max_speed:    top speed in cells per time step
+        turn_penalty: time steps needed for a 90 degree turn in place
+    """
+    def __init__(self, acceleration=0.5, max_speed=2.0, turn_penalty=1.0):
+        self.acceleration = float(acceleration)
+        self.max_speed = float(max_speed)
+        self.turn_penalty = float(turn_penalty)
+        super(Accelerated_motion, self).__init__()
+        self.name = "Accelerated Motion"
+
+
+    def command_time(self, rotation, movement):
+        """ Time needed for one command. Forward moves without rotation extend the current straight run. """
+        time = self.turn_time(rotation)
+        if (rotation != 0) or (movement <= 0):
+            self.run_cells = 0 # The robot stops to turn, reverse or stand still.
+        if movement < 0:
+            return time + self.straight_time(-movement)
+        time += self.straight_time(self.run_cells + movement) - self.straight_time(self.run_cells)
+        self.run_cells += movement
+        return time
+
+
+    def turn_time(self, rotation):
+        """ Time needed to rotate in place. """
+        if rotation in [-90, 90]:
+            return self.turn_penalty
+        return 0
+
+
+    def straight_time(self, cells):
+        """ Time needed to cover a straight run of cells starting and ending at rest. """
+        if cells <= 0:
+            return 0
+        ramp = self.max_speed**2 / self.acceleration # Distance spent accelerating to and braking from max speed.
+        if cells <= ramp:
+            return 2 * math.sqrt(cells / self.acceleration)
+        return 2 * self.max_speed / self.acceleration + (cells - ramp) / self.max_speed
@@ -0,0 +1,136 @@
+from maze import Maze
+from tester import run_trial, maze_goal, score, max_time
+import algorithms
+import argparse
+import csv
+import glob
+
+
+def algorithm_classes(module=algorithms, baseline=algorithms.Oracle_waterfall):
+    """ Return Algorithm and every subclass defined in the algorithms module, except the baseline. """
+    classes = list()
+    pending = [algorithms.Algorithm]
+    while pending:
+        cls = pending.pop(0)
+        if (cls.__module__ == module.__name__) and (cls is not baseline) and (cls not in classes):
+            classes.append(cls)
+        pending.extend(cls.__subclasses__())
+    return classes
+
+
+def run_algorithm(testmaze, cls):
+    """ Run one algorithm class on a maze. Return its name and run times. """
+    maze_dim = testmaze.get_dim()
+    algorithm = cls(maze_dim, maze_goal(maze_dim))
+    return algorithm.get_name(), run_trial(testmaze, algorithm, verbose=False)
+
+
+def optimality_gaps(maze_files, classes=None):
+    """ Measure every algorithm against Oracle_waterfall on each maze. Return one result row per maze and algorithm.
+        run_gap is the extra run 1 steps, explore_gap the extra run 0 steps over the oracle's direct route. """
+    if classes == None:
+        classes = algorithm_classes()
+    rows = list()
+    for maze_file in maze_files:
+        testmaze = Maze(maze_file)
+        oracle_name, oracle = run_algorithm(testmaze, algorithms.Oracle_waterfall)
+        for cls in classes:
+            name, runtimes = run_algorithm(testmaze, cls)
+            row = {"maze": maze_file, "dim": testmaze.get_dim(), "algorithm": name,
+                   "run_0": None, "run_1": None, "explore_gap": None, "run_gap": None,
+                   "score": score(runtimes), "score_gap": None, "failed_run": None}
+            if len(runtimes) > 0:
+                row["run_0"] = runtimes[0]
+                row["explore_gap"] = runtimes[0] - oracle[0]
+            if len(runtimes) > 1:
+                row["run_1"] = runtimes[1]
+                row["run_gap"] = runtimes[1] - oracle[1]
+                row["score_gap"] = row["score"] - score(oracle)
+            else:
+                row["failed_run"] = len(runtimes) # Run that never reached the goal within max_time.
+            rows.append(row)
+    return rows
+
+
+def mean(values):
+    values = [v for v in values if v != None]
+    if not values:
+        return None
+    return sum(values) / float(len(values))
+
+
+def format_table(header, rows):
+    """ Lay out rows of values as a fixed width text table. """
+    cells = [[("-" if value == None else ("{:.2f}".format(value) if isinstance(value, float) else str(value)))
+              for value in row] for row in rows]
+    widths = [max([len(h)] + [len(row[c]) for row in cells]) for c, h in enumerate(header)]
+    lines = ["  ".join(h.ljust(widths[c]) for c, h in enumerate(header))]
+    lines.append("  ".join("-"*w for w in widths))
+    for row in cells:
+        lines.append("  ".join(value.ljust(widths[c]) for c, value in enumerate(row)))
+    return "\n".join(lines)
+
+
+def aggregate_table(rows):
+    """ Summarize the gaps of each algorithm over all mazes. """
+    names = list()
+    for row in rows:
+        if row["algorithm"] not in names:
+            names.append(row["algorithm"])
+    table = list()
+    for name in names:
+        results = [row for row in rows if row["algorithm"] == name]
+        completed = [row for row in results if row["failed_run"] == None]
+        table.append([name, len(completed), len(results) - len(completed),
+                      mean([row["run_gap"] for row in completed]),
+                      max([row["run_gap"] for row in completed]) if completed else None,
+                      mean([row["explore_gap"] for row in completed]),
+                      mean([row["score_gap"] for row in completed])])
+    header = ["algorithm", "completed", "failed", "mean run gap", "max run gap", "mean explore gap", "mean score gap"]
+    return format_table(header, table)
+
+
+def maze_table(rows, maze_file):
+    """ Drill down into the results of every algorithm on one maze. """
+    table = list()
+    for row in rows:
+        if row["maze"] != maze_file:
+            continue
+        status = "ok"
+        if row["failed_run"] != None:
+            status = "run {} exceeded {} steps".format(row["failed_run"], max_time)
+        table.append([row["algorithm"], row["run_0"], row["run_1"], row["explore_gap"], row["run_gap"],
+                      row["score"], row["score_gap"], status])
+    header = ["algorithm", "run 0", "run 1", "explore gap", "run gap", "score", "score gap", "status"]
+    return format_table(header, table)
+
+
+if __name__ == '__main__':
+    """ Report how far each algorithm falls from the oracle on a corpus of mazes. """
+    parser = argparse.ArgumentParser(description="Optimality gap of every algorithm against Oracle_waterfall.")
+    parser.add_argument('mazes', nargs='*', help="maze files to run, defaults to test_maze_*.txt")
+    parser.add_argument('--csv', default=None, help="also write the per maze results to this csv file")
+    parser.add_argument('--summary', action='store_true', help="print only the aggregate table")
+    args = parser.parse_args()
+
+    maze_files = args.mazes or sorted(glob.glob("test_maze_*.txt"))
+    rows = optimality_gaps(maze_files)
+
+    print("*"*30)
+    print(aggregate_table(rows))
+    failures = [row for row in rows if row["failed_run"] != None]
+    for row in failures:
+        print("FAILED: {} on {}, run {} did not reach the goal within {} steps.".format(
+            row["algorithm"], row["maze"], row["failed_run"], max_time))
+    if not args.summary:
+        for maze_file in maze_files:
+            print("*"*30)
+            print(maze_file)
+            print(maze_table(rows, maze_file))
+    print("*"*30)
+
+    if args.csv:
+        with open(args.csv, 'w') as f_out:
+            writer = csv.DictWriter(f_out, fieldnames=sorted(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -1,6 +1,8 @@
 from maze import Maze
 from showmaze import display_maze, display_robot
-from algorithms import Oracle_waterfall, Algorithm, Waterfall, Search_waterfall
+from algorithms import Oracle_waterfall, Algorithm, Waterfall, Search_waterfall, Timed_waterfall
+from algorithms import Hierarchical_waterfall, Bidirectional_waterfall, Corridor_waterfall, Anytime_waterfall
+from motion import Accelerated_motion
 from robot import Robot
 import sys
 
@@ -19,132 +21,173 @@ dir_reverse = {'u': 'd', 'r': 'l', 'd': 'u', 'l': 'r',
 max_time = 1000
 train_score_mult = 1/30.
 
+
+def maze_goal(maze_dim):
+    """ Return the four center cells of a maze, the goal used for every trial. """
+    center = maze_dim // 2
+    return [(center, center), (center, center-1), (center-1, center), (center-1, center-1)]
+
+
+def score(runtimes):
+    """ Combine the run times of a trial into a single score. None if the trial did not complete. """
+    if len(runtimes) == 2:
+        return runtimes[1] + train_score_mult*runtimes[0]
+    return None
+
+
+def run_trial(testmaze, algorithm, draw_robot=None, verbose=True, knowledge_dir=None, motion_model=None):
+    """ Run an algorithm through the exploration and speed runs on a maze. Return the list of run times.
+        If knowledge_dir is given the algorithm warm starts from, and afterwards saves, its map of this maze.
+        If motion_model is given it records the estimated time of each run in motion_model.runtimes. """
+    def report(message):
+        if verbose: print(message)
+
+    algorithm.knowledge_dir = knowledge_dir
+    if motion_model: motion_model.start_trial()
+
+    testrobot = Robot(testmaze.get_dim(), algorithm)
+    if algorithm.get_name() == "Oracle Waterfall":
+        _ = algorithm.maze_oracle(testmaze) #If the algorithm under test is the oracle, give it the maze.
+
+    # Record robot performance over two runs.
+    runtimes = []
+    total_time = 0
+    for run in range(2):
+        report("Starting  {}  run {}, ".format(algorithm.get_name(), run))
+
+        # Set the robot in the start position. Note that robot position
+        # parameters are independent of the robot itself.
+        robot_pos = {'location': [0, 0], 'heading': 'up'}
+        if motion_model: motion_model.start_run()
+
+        run_active = True
+        hit_goal = False
+        while run_active:
+            # check for end of time
+            total_time += 1
+            if total_time > max_time:
+                run_active = False
+                report("Allotted time exceeded.")
+                break
+
+            # provide robot with sensor information, get actions
+            sensing = [testmaze.dist_to_wall(robot_pos['location'], heading)
+                       for heading in dir_sensors[robot_pos['heading']]]
+            rotation, movement = testrobot.next_move(sensing)
+
+            # check for a reset
+            if (rotation, movement) == ('Reset', 'Reset'):
+                if run == 0 and hit_goal:
+                    run_active = False
+                    runtimes.append(total_time)
+                    if motion_model: motion_model.end_run()
+                    if draw_robot: draw_robot = display_robot(draw_robot.window, fill=draw_robot.pen.fillcolor())
+                    report("Ending first run. Starting next run.")
+                    break
+                elif run == 0 and not hit_goal:
+                    report("Cannot reset - robot has not hit goal yet.")
+                    continue
+                else:
+                    report("Cannot reset on runs after the first.")
+                    continue
+
+            # perform rotation
+            if rotation == -90:
+                robot_pos['heading'] = dir_sensors[robot_pos['heading']][0]
+                if draw_robot: draw_robot.move_bot(robot_pos['location'], rotation)
+            elif rotation == 90:
+                robot_pos['heading'] = dir_sensors[robot_pos['heading']][2]
+                if draw_robot: draw_robot.move_bot(robot_pos['location'], rotation)
+            elif rotation == 0:
+                pass
+            else:
+                report("Invalid rotation value, no rotation performed.")
+
+            # perform movement
+            if abs(movement) > 3:
+                report("Movement limited to three squares in a turn.")
+            movement = max(min(int(movement), 3), -3) # fix to range [-3, 3]
+            moved = 0
+            while movement:
+                if movement > 0:
+                    if testmaze.is_permissible(robot_pos['location'], robot_pos['heading']):
+                        robot_pos['location'][0] += dir_move[robot_pos['heading']][0]
+                        robot_pos['location'][1] += dir_move[robot_pos['heading']][1]
+                        movement -= 1
+                        moved += 1
+                    else:
+                        report("Movement stopped by wall.")
+                        movement = 0
+                else:
+                    rev_heading = dir_reverse[robot_pos['heading']]
+                    if testmaze.is_permissible(robot_pos['location'], rev_heading):
+                        robot_pos['location'][0] += dir_move[rev_heading][0]
+                        robot_pos['location'][1] += dir_move[rev_heading][1]
+                        movement += 1
+                        moved -= 1
+                    else:
+                        report("Movement stopped by wall.")
+                        movement = 0
+                if draw_robot:
+                    if run == 0:
+                        draw_robot.move_bot(location=robot_pos['location'])
+                    else:
+                        draw_robot.track_bot(location=robot_pos['location'])
+
+            if motion_model: motion_model.record(rotation if rotation in [-90, 0, 90] else 0, moved)
+
+            # check for goal entered
+            goal_bounds = [testmaze.dim/2 - 1, testmaze.dim/2]
+            if robot_pos['location'][0] in goal_bounds and robot_pos['location'][1] in goal_bounds:
+                hit_goal = True
+                if run != 0:
+                    runtimes.append(total_time - sum(runtimes))
+                    if motion_model: motion_model.end_run()
+                    run_active = False
+                    report("Goal found; run {} completed!".format(run))
+    algorithm.save_knowledge()
+    algorithm.close()
+    return runtimes
+
+
 if __name__ == '__main__':
     """ This script tests a robot based on the code in robot.py on a maze given
     as an argument when running the script. """
 
     draw = True
-    
+    knowledge_dir = None # Set to a directory, e.g. algorithms.knowledge_dir, to reuse maps learned on earlier runs.
+
     # Create a maze based on input argument on command line.
     testmaze = Maze("test_maze_01.txt")
     #testmaze = Maze(str(sys.argv[1]))
-    
+
     if draw: draw_maze = display_maze(testmaze, 40)
-    algorithms = {0:Oracle_waterfall, 1:Algorithm, 2:Waterfall, 3:Search_waterfall}
-    color = {0:"Blue", 1:"Red", 2:"Green", 3:"Orange"}
+    algorithms = {0:Oracle_waterfall, 1:Algorithm, 2:Waterfall, 3:Search_waterfall, 4:Timed_waterfall,
+                  5:Hierarchical_waterfall, 6:Bidirectional_waterfall, 7:Corridor_waterfall, 8:Anytime_waterfall}
+    color = {0:"Blue", 1:"Red", 2:"Green", 3:"Orange", 4:"Purple", 5:"Brown", 6:"Gray", 7:"Cyan", 8:"Magenta"}
+    motion_model = Accelerated_motion() # Estimates the time a physical robot would need for each run.
     maze_dim = testmaze.get_dim()
-    center = maze_dim // 2
-    goal = [(center, center), (center, center-1), (center-1, center), (center-1, center-1)]
-    
-    for i in range(0, 4):
+    goal = maze_goal(maze_dim)
+
+    for i in range(0, len(algorithms)):
         # Intitialize a robot; robot receives info about maze dimensions.
         algorithm = algorithms[i](maze_dim, goal)
-        testrobot = Robot(testmaze.get_dim(), algorithm)
-        if algorithm.get_name() == "Oracle Waterfall": 
-            _ = algorithm.maze_oracle(testmaze) #If the algorithm under test is the oracle, give it the maze.
+        draw_robot = None
         if draw: draw_robot = display_robot(draw_maze, fill=color[i])
 
-        # Record robot performance over two runs.
-        runtimes = []
-        total_time = 0
         print("*"*30)
-        for run in range(2):
-            print("Starting ", algorithm.get_name(), " run {}, ".format(run))
-
-            # Set the robot in the start position. Note that robot position
-            # parameters are independent of the robot itself.
-            robot_pos = {'location': [0, 0], 'heading': 'up'}
-
-            run_active = True
-            hit_goal = False
-            while run_active:
-                # check for end of time
-                total_time += 1
-                if total_time > max_time:
-                    run_active = False
-                    print("Allotted time exceeded.")
-                    break
-
-                # provide robot with sensor information, get actions
-                sensing = [testmaze.dist_to_wall(robot_pos['location'], heading)
-                           for heading in dir_sensors[robot_pos['heading']]]
-                rotation, movement = testrobot.next_move(sensing)
-
-                # check for a reset
-                if (rotation, movement) == ('Reset', 'Reset'):
-                    if run == 0 and hit_goal:
-                        run_active = False
-                        runtimes.append(total_time)
-                        if draw: draw_robot = display_robot(draw_maze, fill=color[i])
-                        print("Ending first run. Starting next run.")
-                        break
-                    elif run == 0 and not hit_goal:
-                        print("Cannot reset - robot has not hit goal yet.")
-                        continue
-                    else:
-                        print("Cannot reset on runs after the first.")
-                        continue
-
-                # perform rotation
-                if rotation == -90:
-                    robot_pos['heading'] = dir_sensors[robot_pos['heading']][0]
-                    if draw:
-                        if run == 0:
-                            draw_robot.move_bot(robot_pos['location'], rotation)
-                        else:
-                            draw_robot.move_bot(robot_pos['location'], rotation)
-                elif rotation == 90:
-                    robot_pos['heading'] = dir_sensors[robot_pos['heading']][2]
-                    if draw: 
-                        if run == 0:
-                            draw_robot.move_bot(robot_pos['location'], rotation)
-                        else:
-                            draw_robot.move_bot(robot_pos['location'], rotation)
-                elif rotation == 0:
-                    pass
-                else:
-                    print("Invalid rotation value, no rotation performed.")
-
-                # perform movement
-                if abs(movement) > 3:
-                    print("Movement limited to three squares in a turn.")
-                movement = max(min(int(movement), 3), -3) # fix to range [-3, 3]
-                while movement:
-                    if movement > 0:
-                        if testmaze.is_permissible(robot_pos['location'], robot_pos['heading']):
-                            robot_pos['location'][0] += dir_move[robot_pos['heading']][0]
-                            robot_pos['location'][1] += dir_move[robot_pos['heading']][1]
-                            movement -= 1
-                        else:
-                            print("Movement stopped by wall.")
-                            movement = 0
-                    else:
-                        rev_heading = dir_reverse[robot_pos['heading']]
-                        if testmaze.is_permissible(robot_pos['location'], rev_heading):
-                            robot_pos['location'][0] += dir_move[rev_heading][0]
-                            robot_pos['location'][1] += dir_move[rev_heading][1]
-                            movement += 1
-                        else:
-                            print("Movement stopped by wall.")
-                            movement = 0
-                    if draw: 
-                        if run == 0:
-                            draw_robot.move_bot(location=robot_pos['location'])
-                        else:
-                            draw_robot.track_bot(location=robot_pos['location'])
-
-                # check for goal entered
-                goal_bounds = [testmaze.dim/2 - 1, testmaze.dim/2]
-                if robot_pos['location'][0] in goal_bounds and robot_pos['location'][1] in goal_bounds:
-                    hit_goal = True
-                    if run != 0:
-                        runtimes.append(total_time - sum(runtimes))
-                        run_active = False
-                        print("Goal found; run {} completed!".format(run))
+        runtimes = run_trial(testmaze, algorithm, draw_robot, knowledge_dir=knowledge_dir, motion_model=motion_model)
 
         # Report score if robot is successful.
         if len(runtimes) == 2:
-            print("Task complete! Score: {:4.3f}".format(runtimes[1] + train_score_mult*runtimes[0]))
+            print("Task complete! Score: {:4.3f}".format(score(runtimes)))
+            print("{} score: {:4.3f}".format(motion_model.get_name(), score(motion_model.runtimes)))
+        if isinstance(algorithm, Anytime_waterfall):
+            latency = algorithm.latency_report()
+            print("{} of {} decisions over the {}s budget, {} acted on an unfinished search. Worst: {:.4f}s".format(
+                latency["deadline_misses"], latency["decisions"], algorithm.time_budget, latency["unfinished"],
+                latency["worst_decision"]))
+            print("Speed run plan: {} commands, unbounded search: {}".format(latency["plan"], latency["unbounded_plan"]))
 
     print("*"*30)
-    draw_maze.get_window().exitonclick() # Draw maze then exit on click
\ No newline at end of file
+    draw_maze.get_window().exitonclick() # Draw maze then exit on click
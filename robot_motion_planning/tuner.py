@@ -0,0 +1,93 @@
+from maze import Maze
+from tester import run_trial, maze_goal, score
+from multiprocessing import Pool
+import algorithms
+import argparse
+import glob
+import itertools
+import json
+import os
+
+# Exploration parameters to search, by algorithm class. Each entry maps a constructor keyword to candidate values.
+search_space = {"Waterfall": {"laps": list(range(1, 10))}}
+
+
+def parameter_grid(space):
+    """ Expand a parameter search space into a list of keyword dictionaries. """
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*[space[k] for k in keys])]
+
+
+def evaluate(job):
+    """ Run one algorithm, with one parameter setting, on one maze. Return the job with its score attached. """
+    maze_file, alg_name, params = job
+    testmaze = Maze(maze_file)
+    maze_dim = testmaze.get_dim()
+    algorithm = getattr(algorithms, alg_name)(maze_dim, maze_goal(maze_dim), **params)
+    runtimes = run_trial(testmaze, algorithm, verbose=False)
+    return maze_file, maze_dim, alg_name, params, score(runtimes)
+
+
+def tune(maze_files, space=search_space, processes=None):
+    """ Score every parameter setting on every maze in parallel. Return the best setting per algorithm and maze size. """
+    jobs = [(maze_file, alg_name, params) for maze_file in maze_files
+            for alg_name in sorted(space) for params in parameter_grid(space[alg_name])]
+    pool = Pool(processes)
+    try:
+        results = pool.map(evaluate, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Group scores by algorithm, maze size and parameter setting.
+    scores = dict()
+    for maze_file, maze_dim, alg_name, params, trial_score in results:
+        key = (alg_name, maze_dim, json.dumps(params, sort_keys=True))
+        scores.setdefault(key, list()).append(trial_score)
+
+    best = dict()
+    for (alg_name, maze_dim, params), trial_scores in scores.items():
+        if None in trial_scores: # A setting that fails any maze of this size is never selected.
+            continue
+        mean_score = sum(trial_scores) / len(trial_scores)
+        current = best.setdefault(alg_name, dict()).get(maze_dim)
+        if (current == None) or (mean_score < current[1]):
+            best[alg_name][maze_dim] = (json.loads(params), mean_score, len(trial_scores))
+    return best
+
+
+def save_profile(best, filename=algorithms.profile_file):
+    """ Merge the tuned settings into the profile file loaded by the algorithms. """
+    profile = dict()
+    if os.path.exists(filename):
+        with open(filename, 'r') as f_in:
+            profile = json.load(f_in)
+    for alg_name in best:
+        for maze_dim, (params, mean_score, mazes) in best[alg_name].items():
+            profile.setdefault(alg_name, dict())[str(maze_dim)] = params
+    with open(filename, 'w') as f_out:
+        json.dump(profile, f_out, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    """ Search exploration parameters over a corpus of mazes and save the score minimizing settings. """
+    parser = argparse.ArgumentParser(description="Tune exploration parameters over a maze corpus.")
+    parser.add_argument('mazes', nargs='*', help="maze files to tune on, defaults to test_maze_*.txt")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes, defaults to cpu count")
+    parser.add_argument('--profile', default=algorithms.profile_file, help="profile file to update")
+    parser.add_argument('--dry-run', action='store_true', help="report results without saving the profile")
+    args = parser.parse_args()
+
+    maze_files = args.mazes or sorted(glob.glob("test_maze_*.txt"))
+    best = tune(maze_files, processes=args.processes)
+
+    print("*"*30)
+    for alg_name in sorted(best):
+        for maze_dim in sorted(best[alg_name]):
+            params, mean_score, mazes = best[alg_name][maze_dim]
+            print("{} {}x{}: {} mean score {:4.3f} over {} maze(s)".format(
+                alg_name, maze_dim, maze_dim, params, mean_score, mazes))
+    if not args.dry_run:
+        save_profile(best, args.profile)
+        print("Profile saved to {}".format(args.profile))
+    print("*"*30)